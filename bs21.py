@@ -24,6 +24,7 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 import datetime
+import functools
 import json
 import logging
 import os
@@ -36,6 +37,7 @@ import time
 _USAGE = "usage"
 _DESCR = "descr"
 _PARAMS = "params"
+_PARAMS_RE = "params_re"
 
 COMMANDS = {
     "aliases": {
@@ -167,6 +169,13 @@ COMMANDS = {
     }
 }
 
+# compile parameter patterns once instead of on every validation
+for _cmd_def in COMMANDS.values():
+    _cmd_def[_PARAMS_RE] = [re.compile(p) for p in _cmd_def[_PARAMS]]
+
+# command names in help order
+_SORTED_COMMANDS = tuple(sorted(COMMANDS))
+
 
 class BS21Exception(Exception):
 
@@ -177,6 +186,12 @@ class BS21Exception(Exception):
 class Alias():
 
     _KNOWN_SOCKETS_FILE = ".known_bs21"
+    _KNOWN_SOCKETS_LINE_RE = re.compile(r"([0-9A-Fa-f:]+) +([0-9]{4}) +(.*)$")
+
+    # aliases are read again only if the file has changed, see get_aliases()
+    _aliases = None
+    _aliases_by_address = None
+    _aliases_source = None
 
     address = ""
     pin = ""
@@ -190,26 +205,28 @@ class Alias():
     @staticmethod
     def validate_pin(pin: str) -> bool:
 
-        try:
-            return int(pin) >= 0 and int(pin) <= 9999
-
-        except:
-            return False
+        return isinstance(pin, str) and len(pin) == 4 and pin.isascii() and pin.isdigit()
 
     @staticmethod
-    def get_aliases() -> list:
+    def _get_aliases_filename() -> str:
 
-        try:
-            filename = os.path.join(os.environ['USERPROFILE'] if os.name == "nt" else os.environ['HOME']
-                                    if "HOME" in os.environ else "~", Alias._KNOWN_SOCKETS_FILE)
+        return os.path.join(os.environ.get('USERPROFILE', "~") if os.name == "nt" else os.environ['HOME']
+                            if "HOME" in os.environ else "~", Alias._KNOWN_SOCKETS_FILE)
+
+    @staticmethod
+    def _read_aliases(filename: str) -> list:
 
-            aliases = list()
+        aliases = list()
 
+        try:
             if os.path.isfile(filename):
                 with open(filename, "r") as ins:
                     for line in ins:
-                        _m = re.match(
-                            r"([0-9A-Fa-f:]+) +([0-9]{4}) +(.*)$", line)
+                        # skip empty lines and comments before using the regex
+                        if not line.strip() or line.startswith("#"):
+                            continue
+
+                        _m = Alias._KNOWN_SOCKETS_LINE_RE.match(line)
                         if _m:
                             aliases.append(Alias(address=_m.groups()[
                                            0], pin=_m.groups()[1], alias=_m.groups()[2]))
@@ -219,15 +236,41 @@ class Alias():
 
         return aliases
 
+    @staticmethod
+    def get_aliases() -> list:
+
+        filename = Alias._get_aliases_filename()
+        try:
+            mtime = os.stat(filename).st_mtime_ns
+
+        except OSError:
+            mtime = None
+
+        if Alias._aliases is None or (filename, mtime) != Alias._aliases_source:
+            Alias._aliases = Alias._read_aliases(filename)
+            Alias._aliases_source = (filename, mtime)
+
+            # first entry wins if an address is listed more than once
+            Alias._aliases_by_address = dict()
+            for _a in reversed(Alias._aliases):
+                Alias._aliases_by_address[_a.address.upper()] = _a
+
+        return Alias._aliases
+
+    @staticmethod
+    def get_alias_by_address(address: str):
+
+        Alias.get_aliases()
+        return Alias._aliases_by_address.get(address.upper())
+
     @staticmethod
     def get_address_n_alias(s: str):
 
-        aliases = Alias.get_aliases()
-        for alias in aliases:
+        for alias in Alias.get_aliases():
             if s == alias.address or s in alias.alias:
                 return alias.address, alias
 
-        if re.match(Device.MAC_PATTERN, s):
+        if Device.MAC_RE.fullmatch(s):
             return s, None
         else:
             return None, None
@@ -240,10 +283,20 @@ class Alias():
 class Device(Alias):
 
     MAC_PATTERN = r"5C:B6:CC:[0-9A-F]{2}:[0-9A-F]{2}:[0-9A-F]{2}"
+    MAC_RE = re.compile(MAC_PATTERN)
+
+    _BLUETOOTHCTL_CONTROLLER_RE = re.compile(r"Controller ([0-9A-F:]+) (.+)")
+    _BLUETOOTHCTL_DEVICE_RE = re.compile(r"Device (%s) (.+)" % MAC_PATTERN)
 
     PORT_BLUETOOTH = "Bluetooth"
     PORT_SERIAL = "Serial"
 
+    # seconds to reuse the result of the expensive device discovery
+    DEVICES_CACHE_TTL = 5.0
+
+    _devices_cache = None
+    _devices_cache_time = 0.0
+
     port = ""
     controller = ""
     mac = ""
@@ -256,19 +309,32 @@ class Device(Alias):
         self.mac = mac
         self.name = name
 
+    @staticmethod
+    def invalidate_cache() -> None:
+
+        Device._devices_cache = None
+
     @staticmethod
     def get_devices() -> list:
 
-        _devices = Device.get_devices_for_windows(
-        ) if os.name == "nt" else Device.get_devices_for_linux()
-        _aliases = Alias.get_aliases()
+        if Device._devices_cache is None or time.monotonic() - Device._devices_cache_time >= Device.DEVICES_CACHE_TTL:
+            Device._devices_cache = Device.get_devices_for_windows(
+            ) if os.name == "nt" else Device.get_devices_for_linux()
+            Device._devices_cache_time = time.monotonic()
 
-        if len(_aliases) > 0:
-            for _d in _devices:
-                a = [ _a for _a in _aliases if _a.address.upper() == _d.address.upper() ]
-                if a:
-                    _d.alias = a[0].alias
-                    _d.pin = a[0].pin
+        # fresh copies per call, so the cache never holds stale alias data
+        _devices = list()
+        for _d in Device._devices_cache:
+            _a = Alias.get_alias_by_address(_d.address)
+            _devices.append(Device(
+                address=_d.address,
+                pin=_a.pin if _a else _d.pin,
+                alias=_a.alias if _a else _d.alias,
+                port=_d.port,
+                controller=_d.controller,
+                mac=_d.mac,
+                name=_d.name
+            ))
 
         return _devices
 
@@ -279,35 +345,40 @@ class Device(Alias):
 
             command_str = "\n".join(commands)
 
-            p1 = subprocess.Popen(["echo", "-e", "%s\nquit\n\n" % command_str],
-                                  stdout=subprocess.PIPE)
-            p2 = subprocess.Popen(["bluetoothctl"],
-                                  stdin=p1.stdout,
-                                  stdout=subprocess.PIPE,
-                                  stderr=subprocess.PIPE)
-            p1.stdout.close()
-            out, err = p2.communicate()
+            p = subprocess.Popen(["bluetoothctl"],
+                                 stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+            out, err = p.communicate(
+                input=("%s\nquit\n\n" % command_str).encode("utf8"))
             return out.decode("utf8")
 
-        output = _exec_bluetoothctl(commands=["list"])
+        def _parse_devices(output: str, controller: str) -> list:
+
+            return [Device(
+                port=Device.PORT_BLUETOOTH,
+                address=match.group(1),
+                controller=controller,
+                mac=match.group(1),
+                name=match.group(2)
+            ) for match in Device._BLUETOOTHCTL_DEVICE_RE.finditer(output)]
+
+        # devices of the default controller are listed in the same call
+        output = _exec_bluetoothctl(commands=["list", "devices"])
 
         controllers = list()
-        for match in re.finditer(r"Controller ([0-9A-F:]+) (.+)", output):
+        for match in Device._BLUETOOTHCTL_CONTROLLER_RE.finditer(output):
             controllers.append(match.group(1))
 
+        # usual case of a single controller, no need to select it
+        if len(controllers) == 1:
+            return _parse_devices(output, controllers[0])
+
         _devices = list()
         for controller in controllers:
             time.sleep(.25)
             output = _exec_bluetoothctl(["select %s" % controller, "devices"])
-            for match in re.finditer(r"Device (%s) (.+)" % Device.MAC_PATTERN, output):
-
-                _devices.append(Device(
-                    port=Device.PORT_BLUETOOTH,
-                    address=match.group(1),
-                    controller=controller,
-                    mac=match.group(1),
-                    name=match.group(2)
-                ))
+            _devices += _parse_devices(output, controller)
 
         return _devices
 
@@ -315,17 +386,17 @@ class Device(Alias):
     def get_devices_for_windows() -> list:
 
         import serial.tools.list_ports
+        _has_rfcomm = hasattr(socket, "BTPROTO_RFCOMM")
         _devices = list()
         for p in list(serial.tools.list_ports.comports()):
             if p.hwid.startswith("BTHENUM"):
-                _mac = "".join(["%s%s" % (s, ":" if i % 2 else "") for i, s in enumerate(
-                    p.hwid.split("\\")[-1].split("&")[-1][:12])])[:-1]
-                if re.match(Device.MAC_PATTERN, _mac):
+                _hex = p.hwid.split("\\")[-1].split("&")[-1][:12]
+                _mac = ":".join([_hex[i:i + 2] for i in range(0, 12, 2)])
+                if Device.MAC_RE.fullmatch(_mac):
 
                     _d = Device(
                         port=Device.PORT_SERIAL,
-                        address=_mac if "BTPROTO_RFCOMM" in dir(
-                            socket) else p.device,
+                        address=_mac if _has_rfcomm else p.device,
                         mac=_mac,
                         controller=None,
                         name=p.description
@@ -342,6 +413,7 @@ class State(Device):
     #                |     |        + 0=off, 1=on
     #                |     + Serial no., e.g. "004593"
     #                + Model, always "BS-21"
+    _NAME_RE = re.compile(_NAME_PATTERN)
 
     _STATUS_PATTERN = r"\$(BS-21)-([0-9]+)-([01])-(.) (V[0-9]+.[0-9]+) ([0-9]{2}) ([0-9]{2}) ([0-9]{2}) ([0-9]{2})"
     #                   ||       |        |      |   |                |          |          |          |         | Newline "\r\n"
@@ -355,12 +427,40 @@ class State(Device):
     #                   ||       + Serial no., e.g. "004593"
     #                   |+ Model, always "BS-21"
     #                   + Sign for begin response
+    _STATUS_RE = re.compile(_STATUS_PATTERN)
+
+    _SCHEDULER_RE = re.compile(r"([0-9A-Fa-f]{2}) ([0-9]{2}) ([0-9]{2})")
+    #                             |                |          + Minutes
+    #                             |                + Hours
+    #                             + Daymask in hex, e.g. "1F" for Monday to Friday
+
+    _RANDOM_RE = re.compile(r"[0-9A-Fa-f]{2}( [0-9]{2}){5}")
+    #                         |              + start hh, mm, duration hh, mm, active
+    #                         + Daymask in hex
+
+    _COUNTDOWN_RE = re.compile(
+        r"[0-9]{2} [0-9]{2} [0-9]{2} ([0-9]{2}|I.)( [0-9]{2}){4}")
+    #     |        |        |        |             + active, original hh, mm, ss
+    #     |        |        |        + remaining seconds, or "I" plus one char
+    #     |        |        + remaining minutes
+    #     |        + remaining hours
+    #     + type, 00=off / 01=on
 
     _WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
     RANDOM_SCHEDULER = 41
     COUNTDOWN_SCHEDULER = 43
 
+    # countdown state after CLEAR43, copied since callers may change it
+    _CLEARED_COUNTDOWN = {
+        "slot": COUNTDOWN_SCHEDULER,
+        "active": False,
+        "type": "off",
+        "remaining": "00:00:00",
+        "elapsed": "00:00:00",
+        "original": "00:00:00"
+    }
+
     serial = ""
     model = ""
     firmware = ""
@@ -376,65 +476,90 @@ class State(Device):
 
     def get_printable_status(self) -> str:
 
-        s = "\n"
-        s += " MAC-Address:      %s\n" % self.mac
-        s += " PIN:              %s\n" % self.pin
-        s += " Alias:            %s\n" % ("" if not self.alias else self.alias)
-        s += "\n"
-        s += " Model:            %s\n" % self.model
-        s += " Serial no.:       %s\n" % self.serial
-        s += " Firmware:         %s\n" % self.firmware
-        s += "\n"
-        s += " Relais:           %s\n" % ("on" if self.is_on else "off")
-        s += " Random mode:      %s\n" % ("on" if self.is_random else "off")
-        s += " Countdown:        %s\n" % ("on" if self.is_countdown else "off")
-        s += " Power:            %s\n" % ("yes" if self.is_power else "no")
-        s += " Over temperature: %s\n" % ("yes" if self.is_overtemp else "no")
-        s += "\n"
-        s += " Time:             %s, %s" % (
-            self.time["weekday"][0], self.time["time"])
-        s += "\n"
-        return s
+        lines = [
+            "",
+            " MAC-Address:      %s" % self.mac,
+            " PIN:              %s" % self.pin,
+            " Alias:            %s" % ("" if not self.alias else self.alias),
+            "",
+            " Model:            %s" % self.model,
+            " Serial no.:       %s" % self.serial,
+            " Firmware:         %s" % self.firmware,
+            "",
+            " Relais:           %s" % ("on" if self.is_on else "off"),
+            " Random mode:      %s" % ("on" if self.is_random else "off"),
+            " Countdown:        %s" % ("on" if self.is_countdown else "off"),
+            " Power:            %s" % ("yes" if self.is_power else "no"),
+            " Over temperature: %s" % ("yes" if self.is_overtemp else "no"),
+            "",
+            " Time:             %s, %s" % (
+                self.time["weekday"][0], self.time["time"]),
+            ""
+        ]
+        return "\n".join(lines)
 
     def get_printable_schedulers(self) -> str:
 
-        s = ""
+        lines = list()
 
         if len(self.random["schedule"]["weekday"]) > 0:
-            s += " Random:           %s on %s for %s hours, %s\n" % (
+            lines.append(" Random:           %s on %s for %s hours, %s\n" % (
                 self.random["schedule"]["time"],
                 ", ".join(self.random["schedule"]["weekday"]),
                 self.random["duration"][:-3],
                 "active" if self.random["active"] else "inactive"
-            )
+            ))
 
         if self.countdown["active"]:
-            s += " Countdown:        %s, switch %s in %s\n" % (
+            lines.append(" Countdown:        %s, switch %s in %s\n" % (
                 "Running" if self.countdown["active"] else "Stopped",
                 self.countdown["type"],
                 self.countdown["remaining"]
-            )
+            ))
 
-        for scheduler in sorted(self.schedulers, key=lambda s: s["slot"] % 20):
-            if len(scheduler["schedule"]["weekday"]) > 0:
-                s += " Scheduler %02d %s:\tSwitch %s at %s on %s\n" % (
-                    scheduler["slot"] % 20,
-                    scheduler["type"],
-                    scheduler["type"],
-                    scheduler["schedule"]["time"][:-3],
-                    ", ".join(scheduler["schedule"]["weekday"])
-                )
+        # skip unused slots before sorting
+        schedulers = [s for s in self.schedulers if s["schedule"]["weekday"]]
+        for scheduler in sorted(schedulers, key=lambda s: s["slot"] % 20):
+            lines.append(" Scheduler %02d %s:\tSwitch %s at %s on %s\n" % (
+                scheduler["slot"] % 20,
+                scheduler["type"],
+                scheduler["type"],
+                scheduler["schedule"]["time"][:-3],
+                ", ".join(scheduler["schedule"]["weekday"])
+            ))
 
-        return s
+        return "".join(lines)
 
     def __init__(self, address="", pin="", alias="", port="", controller="", mac="", name="") -> None:
 
         super().__init__(address=address, pin=pin, alias=alias,
                          port=port, controller=controller, mac=mac, name=name)
 
+        # own containers per instance, the class level ones are shared
+        self.time = dict()
+        self.schedulers = list()
+        self.random = dict()
+        self.countdown = dict()
+
+    def clear_schedulers(self) -> None:
+
+        self.schedulers = list()
+        self.is_schedulers = False
+
+        self.random = None
+        self.is_random = False
+
+        self.countdown = None
+        self.is_countdown = False
+
+    def clear_countdown(self) -> None:
+
+        self.countdown = dict(State._CLEARED_COUNTDOWN)
+        self.is_countdown = False
+
     def set_state_from_name(self, name: str) -> None:
 
-        matcher = re.search(State._NAME_PATTERN, name)
+        matcher = State._NAME_RE.search(name)
         if matcher == None:
             raise BS21Exception("ERROR: Unexpected device name!")
 
@@ -452,23 +577,25 @@ class State(Device):
             raise BS21Exception(
                 "ERROR: Device has explicitly responded with error! Do you want to double-check PIN?")
 
-        matcher = re.search(State._STATUS_PATTERN, response)
+        matcher = State._STATUS_RE.search(response)
         if matcher == None:
             raise BS21Exception("ERROR: Unexpected response from device!")
 
-        self.model = matcher.group(1)
-        self.serial = matcher.group(2)
-        self.firmware = matcher.group(5)
-        self.is_on = matcher.group(3) == "1"
-        self.is_overtemp = (ord(matcher.group(4)) & 2) > 0
-        self.is_power = (ord(matcher.group(4)) & 4) > 0
-        self.is_random = (ord(matcher.group(4)) & 8) > 0
-        self.is_countdown = (ord(matcher.group(4)) & 16) > 0
+        groups = matcher.groups()
+
+        self.model = groups[0]
+        self.serial = groups[1]
+        self.firmware = groups[4]
+        self.is_on = groups[2] == "1"
+        self.is_overtemp = (ord(groups[3]) & 2) > 0
+        self.is_power = (ord(groups[3]) & 4) > 0
+        self.is_random = (ord(groups[3]) & 8) > 0
+        self.is_countdown = (ord(groups[3]) & 16) > 0
 
-        # day_in_hex = hex(int(matcher.group(6))).replace("x", "0")
-        day_in_hex = matcher.group(6)
+        # day_in_hex = hex(int(groups[5])).replace("x", "0")
+        day_in_hex = groups[5]
         _time = State.build_weekdays_and_time(
-            day_in_hex, matcher.group(7), matcher.group(8), matcher.group(9))
+            day_in_hex, groups[6], groups[7], groups[8])
 
         self.time = _time
 
@@ -481,18 +608,30 @@ class State(Device):
         if len(response) != 442:
             raise BS21Exception("ERROR: Unexpected response from device!")
 
-        # parse schedulers
-        raw = response[14:372].split(" ")
-        self.schedulers = list()
-        for i in range(40):
-            self.schedulers.append({
-                "slot": i + 1,
-                "type": "on" if i <= 19 else "off",
-                "schedule": State.build_weekdays_and_time(raw[i * 3], raw[i * 3 + 1], raw[i * 3 + 2])
-            })
+        # response consists of 2-char fields separated by blanks starting at
+        # offset 14, schedulers are scanned with _SCHEDULER_RE, random mode
+        # and countdown fields are read by position
+
+        # parse schedulers, 3 fields (daymask, hh, mm) each. 40 of them only
+        # fit into this range if none is malformed
+        raw = State._SCHEDULER_RE.findall(response, 14, 373)
+        if len(raw) != 40:
+            raise BS21Exception("ERROR: Unexpected response from device!")
+
+        self.schedulers = [{
+            "slot": i + 1,
+            "type": "on" if i <= 19 else "off",
+            "schedule": State.build_weekdays_and_time(*fields)
+        } for i, fields in enumerate(raw)]
+
+        # random mode and countdown are read by position, so check their
+        # fields before int() gets them
+        if not (State._RANDOM_RE.fullmatch(response, 374, 391)
+                and State._COUNTDOWN_RE.fullmatch(response, 416, 439)):
+            raise BS21Exception("ERROR: Unexpected response from device!")
 
         # parse random mode
-        raw = response[374:414].split(" ")
+        raw = [response[o:o + 2] for o in range(374, 392, 3)]
         self.random = {
             "slot": State.RANDOM_SCHEDULER,
             "active": True if raw[5] != "00" else False,
@@ -501,21 +640,24 @@ class State(Device):
         }
 
         # parse countdown
-        raw = response[416:439].split(" ")
+        raw = [response[o:o + 2] for o in range(416, 440, 3)]
+        _remaining_hours, _remaining_mins = int(raw[1]), int(raw[2])
+        _original_hours, _original_mins, _original_secs = int(
+            raw[5]), int(raw[6]), int(raw[7])
         original = datetime.datetime(
-            2000, 1, 1, int(raw[5]), int(raw[6]), int(raw[7]))
+            2000, 1, 1, _original_hours, _original_mins, _original_secs)
 
-        _remaining_secs = int(raw[7]) if raw[3].startswith(
+        _remaining_secs = _original_secs if raw[3].startswith(
             "I") else int(raw[3])
         remaining = datetime.timedelta(
-            hours=int(raw[1]), minutes=int(raw[2]), seconds=_remaining_secs)
+            hours=_remaining_hours, minutes=_remaining_mins, seconds=_remaining_secs)
         self.countdown = {
             "slot": State.COUNTDOWN_SCHEDULER,
             "active": True if raw[4] != "00" else False,
             "type": "on" if raw[0] != "00" else "off",
-            "remaining": State.build_time(raw[1], raw[2], _remaining_secs),
+            "remaining": State.build_time(_remaining_hours, _remaining_mins, _remaining_secs),
             "elapsed": (original - remaining).strftime("%H:%M:%S"),
-            "original": State.build_time(raw[5], raw[6], raw[7])
+            "original": State.build_time(_original_hours, _original_mins, _original_secs)
         }
 
     @staticmethod
@@ -536,8 +678,8 @@ class State(Device):
     @staticmethod
     def init_state_by_address(address):
 
-        _d = next(filter(lambda _d: _d.address ==
-                  address, Device.get_devices()), None)
+        _d = next((_d for _d in Device.get_devices()
+                   if _d.address == address), None)
         if _d:
             return State.init_state_from_device(_d)
 
@@ -551,16 +693,11 @@ class State(Device):
         _minute = int(minute) % 60
         _second = int(second) % 60
 
-        weekdays = []
-        i = 1
-        for weekday in State._WEEKDAYS:
-            if i & int(day, 16) > 0:
-                weekdays += [weekday]
-            i *= 2
+        weekdays = list(State._WEEKDAYS_BY_MASK[int(day, 16) & 0x7F])
 
         time = {
             "weekday": weekdays,
-            "time": State.build_time(_hour, _minute, _second)
+            "time": "%02d:%02d:%02d" % (_hour, _minute, _second)
         }
 
         return time
@@ -577,6 +714,11 @@ class State(Device):
         return _time
 
 
+# weekdays for each of the 128 possible daymasks
+State._WEEKDAYS_BY_MASK = [tuple(weekday for i, weekday in enumerate(State._WEEKDAYS) if mask & (1 << i))
+                           for mask in range(128)]
+
+
 class BS21():
 
     LOGGER = logging.getLogger("BS21")
@@ -586,6 +728,12 @@ class BS21():
 
     _state = None
 
+    # hex strings of all 128 possible daymasks, e.g. "1F" for Monday to Friday
+    _DAYMASKS = tuple("%02X" % b for b in range(128))
+
+    # large enough for a whole INFO response in one recv
+    _RECV_SIZE = 4096
+
     _PAYLOAD = {
         "on": "REL1",                                     # no parameters
         "off": "REL0",                                    # no parameters
@@ -615,21 +763,24 @@ class BS21():
 
     def connect(self) -> bool:
 
-        try:
-            if re.match(Device.MAC_PATTERN, self._state.address):
-                BS21.LOGGER.debug("Connnect via Bluetooth to %s" %
-                                  self._state.address)
-                self._client_socket = socket.socket(
-                    socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
-                self._client_socket.connect((self._state.address, 1))
-                self._client_socket.settimeout(2)
+        if not Device.MAC_RE.fullmatch(self._state.address):
+            BS21.LOGGER.error(
+                "Connection failed! Invalid mac address %s\n" % self._state.address)
 
-            else:
-                raise BS21Exception("Invalid mac address.")
+            return None
 
-        except:
+        try:
+            BS21.LOGGER.debug("Connnect via Bluetooth to %s" %
+                              self._state.address)
+            self._client_socket = socket.socket(
+                socket.AF_BLUETOOTH, socket.SOCK_STREAM, socket.BTPROTO_RFCOMM)
+            self._client_socket.connect((self._state.address, 1))
+            self._client_socket.settimeout(2)
+
+        except (OSError, AttributeError) as ex:
+            # AttributeError if Python has been built without bluetooth support
             BS21.LOGGER.error(
-                "Connection failed! Check mac address and device.\n")
+                "Connection failed! Check mac address and device. %s\n" % ex)
 
             return None
 
@@ -641,50 +792,64 @@ class BS21():
     def disconnect(self) -> None:
 
         BS21.LOGGER.debug("disconnect")
-        try:
-            if self._client_socket:
+
+        # close each resource on its own, so a failing one doesn't leak the other
+        if self._client_socket:
+            try:
                 self._client_socket.close()
+            except OSError as ex:
+                BS21.LOGGER.debug("closing socket failed: %s" % ex)
 
-            if self._serial:
+            self._client_socket = None
+
+        if self._serial:
+            try:
                 self._serial.close()
+            except OSError as ex:
+                BS21.LOGGER.debug("closing serial failed: %s" % ex)
 
-        except:
-            pass
+            self._serial = None
 
         BS21.LOGGER.debug("disconnected")
 
-    def _send(self, payload: str) -> str:
+    def _write(self, data: str) -> None:
 
-        data = "%s#%s\r\n" % (payload, self._state.pin)
         BS21.LOGGER.debug(" >>> %s" % data)
+        _bytes = data.encode("utf-8")
 
         try:
             if self._serial:
-                self._serial.write(data.encode("utf-8"))
+                self._serial.write(_bytes)
                 self._serial.flush()
 
             elif self._client_socket:
-                self._client_socket.send(data.encode("utf-8"))
+                self._client_socket.sendall(_bytes)
 
         except:
             raise BS21Exception("ERROR: Failed to send command to device!")
 
+    def _receive(self) -> str:
+
         try:
-            _str = ""
-            while True:
+            _buffer = bytearray()
+            _end = -1
+            while _end == -1:
                 if self._serial:
-                    _bytes = list(self._serial.read(1))
+                    _bytes = self._serial.read_until(b"\r\n")
 
                 elif self._client_socket:
-                    _bytes = self._client_socket.recv(1024)
+                    _bytes = self._client_socket.recv(BS21._RECV_SIZE)
 
                 if not _bytes:
                     break
-                _str = _str + _bytes.decode("utf-8")
 
-                # we have reach end of message
-                if _str.find("\r\n") != -1:
-                    break
+                # we have reach end of message, only scan the new bytes and
+                # a "\r" possibly left at the end of the previous ones
+                _start = max(0, len(_buffer) - 1)
+                _buffer.extend(_bytes)
+                _end = _buffer.find(b"\r\n", _start)
+
+            _str = _buffer.decode("utf-8")
 
         except:
             raise BS21Exception(
@@ -694,6 +859,11 @@ class BS21():
 
         return _str
 
+    def _send(self, payload: str) -> str:
+
+        self._write("%s#%s\r\n" % (payload, self._state.pin))
+        return self._receive()
+
     def _is_response_ok(self, response):
 
         return response.startswith("$OK")
@@ -718,7 +888,7 @@ class BS21():
         BS21.LOGGER.debug(" SEND: synchronize time")
 
         now = datetime.datetime.now()
-        weekday = hex(pow(2, now.weekday())).replace("x", "0")[-2:]
+        weekday = BS21._DAYMASKS[1 << now.weekday()]
 
         payload = BS21._PAYLOAD["sync"] % (
             weekday, now.hour, now.minute, now.second)
@@ -773,21 +943,15 @@ class BS21():
     @staticmethod
     def _build_daymask(mon=None, tue=None, wed=None, thu=None, fri=None, sat=None, sun=None) -> str:
 
-        b = 0
-        b += 1 if mon else 0
-        b += 2 if tue else 0
-        b += 4 if wed else 0
-        b += 8 if thu else 0
-        b += 16 if fri else 0
-        b += 32 if sat else 0
-        b += 64 if sun else 0
+        b = (bool(mon) | bool(tue) << 1 | bool(wed) << 2 | bool(thu) << 3
+             | bool(fri) << 4 | bool(sat) << 5 | bool(sun) << 6)
 
-        return hex(b).replace("x", "0")[-2:].upper()
+        return BS21._DAYMASKS[b]
 
     def _get_or_create_and_add_scheduler(self, id):
 
         scheduler = next(
-            filter(lambda _s: _s["slot"] == id, self._state.schedulers), None)
+            (_s for _s in self._state.schedulers if _s["slot"] == id), None)
         if not scheduler:
             scheduler = {
                 "slot": id
@@ -912,17 +1076,16 @@ class BS21():
         if not self._is_response_ok(response):
             raise BS21Exception("ERROR: Device returned error!")
 
-        # todo update state
+        # countdown has just been started, so nothing has elapsed yet
         self._state.is_countdown = True
-        original = datetime.datetime(2000, 1, 1, _h, _m, _s)
-        remaining_secs = (datetime.datetime.today() - original).seconds
+        _original = State.build_time(_h, _m, _s)
         self._state.countdown = {
             "slot": State.COUNTDOWN_SCHEDULER,
             "active": True,
             "type": type,
-            "remaining": State.build_time(remaining_secs // 3600, (remaining_secs % 3600) // 60, remaining_secs % 60),
+            "remaining": _original,
             "elapsed": "00:00:00",
-            "original": State.build_time(_h, _m, _s)
+            "original": _original
         }
 
         BS21.LOGGER.debug(" SUCCESS: countdown set")
@@ -932,13 +1095,12 @@ class BS21():
     def set_countdown_until(self, hour, minute, type) -> State:
 
         now = datetime.datetime.now()
-        then = datetime.datetime(1900, 1, 1, int(hour) %
-                                 24, int(minute) % 60, 0)
+        then = (int(hour) % 24 * 60 + int(minute) % 60) * 60
 
-        duration = (then - now)
-        _h = duration.seconds // 3600
-        _m = duration.seconds % 3600 // 60
-        _s = duration.seconds % 60
+        # seconds until endtime, wraps to next day if already passed
+        duration = (then - (now.hour * 3600 + now.minute * 60 + now.second)) % 86400
+        _h, _rest = divmod(duration, 3600)
+        _m, _s = divmod(_rest, 60)
 
         return self.set_countdown(_h, _m, _s, type)
 
@@ -951,16 +1113,7 @@ class BS21():
         if not self._is_response_ok(response):
             raise BS21Exception("ERROR: Device returned error!")
 
-        # todo update state
-        self._state.is_countdown = False
-        self._state.countdown = {
-            "slot": State.COUNTDOWN_SCHEDULER,
-            "active": False,
-            "type": "off",
-            "remaining": "00:00:00",
-            "elapsed": "00:00:00",
-            "original": "00:00:00"
-        }
+        self._state.clear_countdown()
 
         BS21.LOGGER.debug(" SUCCESS: countdown cleared")
 
@@ -975,14 +1128,7 @@ class BS21():
         if not self._is_response_ok(response):
             raise BS21Exception("ERROR: Device returned error")
 
-        self._state.schedulers = list()
-        self._state.is_schedulers = False
-
-        self._state.random = None
-        self._state.is_random = False
-
-        self._state.countdown = None
-        self._state.is_countdown = False
+        self._state.clear_schedulers()
 
         BS21.LOGGER.debug(" SUCCESS: all schedulers cleared")
 
@@ -1013,25 +1159,8 @@ class BS21():
 
         return self._state
 
-    def disconnect(self):
 
-        try:
-            if self._client_socket:
-                self._client_socket.close()
-
-            if self._serial:
-                self._serial.close()
-
-        except:
-            pass
-
-
-def _build_help(cmd, header=False, msg="") -> None:
-
-    s = ""
-
-    if header == True:
-        s = """ Renkforce BS-21 bluetooth power switch command line interface \
+_HELP_HEADER = """ Renkforce BS-21 bluetooth power switch command line interface \
  for Linux / Raspberry Pi / Windows
 
  USAGE:   bs21.py <mac> <pin> <command1> <params1> <command2> ...
@@ -1039,46 +1168,81 @@ def _build_help(cmd, header=False, msg="") -> None:
           $ ./bs21.py 5C:B6:CC:00:1A:AE 1234 -sync -on
         """
 
-    if msg != "":
-        s += "\n " + msg
 
-    if cmd is not None and cmd in COMMANDS:
-        s += "\n " + \
-            COMMANDS[cmd][_USAGE].ljust(32) + "\t" + COMMANDS[cmd][_DESCR]
+def _build_help(cmd, header=False, msg="") -> None:
 
-    if msg != "":
-        s += "\n"
+    parts = []
 
-    return s
+    if header:
+        parts.append(_HELP_HEADER)
 
+    if msg:
+        parts.append("\n " + msg)
 
-def _help() -> None:
+    # None is never a key of COMMANDS
+    if cmd in COMMANDS:
+        parts.append("\n " + COMMANDS[cmd][_USAGE].ljust(32)
+                     + "\t" + COMMANDS[cmd][_DESCR])
 
-    s = ""
-    i = 0
-    for cmd in sorted(COMMANDS):
-        s += _build_help(cmd, i == 0)
-        i += 1
+    if msg:
+        parts.append("\n")
 
-    return s
+    return "".join(parts)
 
 
-def _translate_for_scheduler_call(id: str, type: str, weekdays: list[str], hours: str, minutes: str) -> list[str]:
+@functools.lru_cache(maxsize=1)
+def _help() -> None:
 
-    params = [id, type, hours, minutes]
-    for i in range(len(weekdays)):
-        params.append(weekdays[i].isupper() and weekdays[i] != "_")
+    return "".join([_build_help(cmd, i == 0)
+                    for i, cmd in enumerate(_SORTED_COMMANDS)])
 
-    return params
+
+def _translate_for_scheduler_call(id: str, type: str, weekdays: list[str], hours: str, minutes: str) -> list[str]:
+
+    # "_".isupper() is False, so no extra check for unset days is needed
+    return [id, type, hours, minutes] + [day.isupper() for day in weekdays]
 
 
 def _translate_for_random_call(weekdays: list[str], hours: str, minutes: str, dur_hours: str, dur_minutes: str) -> list[str]:
 
-    params = [hours, minutes, dur_hours, dur_minutes]
-    for i in range(len(weekdays)):
-        params.append(weekdays[i].isupper())
+    return [hours, minutes, dur_hours, dur_minutes] + [day.isupper() for day in weekdays]
+
+
+def _print_status(bs21: BS21, call) -> None:
 
-    return params
+    bs21.request_state()
+    state = bs21.request_schedulers()
+    print(state.get_printable_status())
+
+
+def _print_json(bs21: BS21, call) -> None:
+
+    bs21.request_state()
+    state = bs21.request_schedulers()
+    print(state.toJSON())
+
+
+_COMMAND_HANDLERS = {
+    "on": lambda bs21, call: bs21.turn_on(),
+    "off": lambda bs21, call: bs21.turn_off(),
+    "toggle": lambda bs21, call: bs21.toggle(),
+    "status": _print_status,
+    "countdown": lambda bs21, call: bs21.set_countdown(*call),
+    "countdown-until": lambda bs21, call: bs21.set_countdown_until(*call),
+    "countdown-clear": lambda bs21, call: bs21.reset_countdown(),
+    "random": lambda bs21, call: bs21.set_random(*_translate_for_random_call(*call)),
+    "random-clear": lambda bs21, call: bs21.reset_random(),
+    "scheduler": lambda bs21, call: bs21.set_scheduler(*_translate_for_scheduler_call(*call)),
+    "scheduler-clear": lambda bs21, call: bs21.reset_scheduler(*call),
+    "clear-all": lambda bs21, call: bs21.reset_all(),
+    "pin": lambda bs21, call: bs21.change_pin(*call),
+    "visible": lambda bs21, call: bs21.set_visible(),
+    "sync": lambda bs21, call: bs21.sync_time(),
+    "schedulers": lambda bs21, call: print(bs21.request_schedulers().get_printable_schedulers()),
+    "json": _print_json,
+    "sleep": lambda bs21, call: time.sleep(int(call[0])),
+    "debug": lambda bs21, call: logging.basicConfig(level=logging.DEBUG)
+}
 
 
 def do_commands(target, pin, commands):
@@ -1098,77 +1262,16 @@ def do_commands(target, pin, commands):
     try:
         for command in commands:
             func = command["func"]
-            call = tuple(command["call"])
-
-            if func == "on":
-                bs21.turn_on()
-
-            elif func == "off":
-                bs21.turn_off()
-
-            elif func == "toggle":
-                bs21.toggle()
-
-            elif func == "status":
-                bs21.request_state()
-                bs21.request_schedulers()
-                print(bs21.get_state().get_printable_status())
-
-            elif func == "countdown":
-                bs21.set_countdown(*call)
-
-            elif func == "countdown-until":
-                bs21.set_countdown_until(*call)
-
-            elif func == "countdown-clear":
-                bs21.reset_countdown()
-
-            elif func == "random":
-                params = _translate_for_random_call(*call)
-                bs21.set_random(*tuple(params))
+            call = command["call"]
 
-            elif func == "random-clear":
-                bs21.reset_random()
-
-            elif func == "scheduler":
-                params = _translate_for_scheduler_call(*call)
-                bs21.set_scheduler(*tuple(params))
-
-            elif func == "scheduler-clear":
-                bs21.reset_scheduler(*call)
-
-            elif func == "clear-all":
-                bs21.reset_all()
-
-            elif func == "pin":
-                b, pin = bs21.change_pin(*call)
-
-            elif func == "visible":
-                bs21.set_visible()
-
-            elif func == "sync":
-                bs21.sync_time()
-
-            elif func == "schedulers":
-                state = bs21.request_schedulers()
-                print(state.get_printable_schedulers())
-
-            elif func == "json":
-                bs21.request_state()
-                state = bs21.request_schedulers()
-                print(state.toJSON())
-
-            elif func == "sleep":
-                time.sleep(int(call[0]))
-
-            elif func == "debug":
-                logging.basicConfig(level=logging.DEBUG)
-
-            else:
+            handler = _COMMAND_HANDLERS.get(func)
+            if handler is None:
                 raise BS21Exception(_help()
                                     + "\n\n ERROR: Invalid command "
                                     + "<" + func + ">\n")
 
+            handler(bs21, call)
+
     except BS21Exception as ex:
         raise BS21Exception(_build_help(None, False, ex.message))
 
@@ -1199,8 +1302,8 @@ def _translate_commands(commands):
             continue
 
         call = []
-        for i in range(len(params)):
-            m = re.search(cmd_def[_PARAMS][i], params[i])
+        for i, (pattern, param) in enumerate(zip(cmd_def[_PARAMS_RE], params)):
+            m = pattern.fullmatch(param)
             if m is None:
                 errors.append(
                     _build_help(func, False,
@@ -1208,9 +1311,9 @@ def _translate_commands(commands):
                 )
                 break
 
-            for group in m.groups():
-                call.append(str(group))
+            call.extend(map(str, m.groups()))
 
+        else:
             command["call"] = call
 
     if len(commands) == 0:
@@ -1229,18 +1332,24 @@ def parse_args(args):
     pin = None
     commands = []
 
+    i = 0
+    n = len(args)
+
     # get target
-    if len(args) > 0 and not args[0].startswith("--"):
-        target = args.pop(0)
+    if i < n and not args[i].startswith("--"):
+        target = args[i]
+        i += 1
 
     # get optional pin
-    if len(args) > 0 and not args[0].startswith("--"):
-        pin = args.pop(0)
+    if i < n and not args[i].startswith("--"):
+        pin = args[i]
+        i += 1
 
     # collect commands
     command = None
-    while (len(args) > 0):
-        arg = args.pop(0)
+    while i < n:
+        arg = args[i]
+        i += 1
 
         # command starts
         if arg.startswith("--"):
@@ -1281,17 +1390,19 @@ if __name__ == "__main__":
 
         # print devices
         elif len(commands) == 0 or commands[0] == "--devices":
-            print("address\tpin\talias\tport\tcontroller\tmac\tname")
-            for _d in Device.get_devices():
-                print("%s\t%s\t%s\t%s\t%s\t%s\t%s" % (_d.address, _d.pin,
-                      _d.alias, _d.port, _d.controller, _d.mac, _d.name))
+            rows = ["address\tpin\talias\tport\tcontroller\tmac\tname"]
+            rows.extend(["%s\t%s\t%s\t%s\t%s\t%s\t%s" % (_d.address, _d.pin,
+                         _d.alias, _d.port, _d.controller, _d.mac, _d.name)
+                         for _d in Device.get_devices()])
+            print("\n".join(rows))
             exit(0)
 
         # print aliases
         elif len(commands) == 0 or commands[0] == "--aliases":
-            print("address\tpin\talias")
-            for _a in Alias.get_aliases():
-                print("%s\t%s\t%s" % (_a.address, _a.pin, _a.alias))
+            rows = ["address\tpin\talias"]
+            rows.extend(["%s\t%s\t%s" % (_a.address, _a.pin, _a.alias)
+                         for _a in Alias.get_aliases()])
+            print("\n".join(rows))
             exit(0)
 
         # do commands